@@ -1,9 +1,23 @@
 # app.py
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+import hmac
 import os
-import random
-import copy
+import threading
+from collections import deque
+
+import numpy as np
+import orjson
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # Pure-Python fallback: the solver below runs unchanged, just slower
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
 
 # --- 1. CONFIGURATION AND INITIALIZATION ---
 
@@ -13,21 +27,29 @@ app = Flask(__name__)
 # It's crucial to set the API_KEY env var during deployment!
 EXPECTED_API_KEY = os.environ.get("API_KEY", "SET_YOUR_API_KEY_IN_ENV") 
 API_KEY_HEADER = "X-Api-Key"
+# Encoded once so each request only encodes the incoming header
+EXPECTED_API_KEY_BYTES = EXPECTED_API_KEY.encode()
+
+# Paths that skip the API key check (Cloud Run health checks carry no key)
+PUBLIC_PATHS = {"/"}
 
 # Replace [YOUR_BUCKET_NAME] with your actual bucket name when you deploy
 FRONTEND_ORIGIN = os.environ.get("FRONTEND_ORIGIN", "SET_YOUR_ENV_KEY")
 
 # Configure CORS: ONLY allow requests from your specific Cloud Storage domain
 # This handles the Access-Control-Allow-Origin header automatically.
-CORS(app, resources={
-    r"/*": {
+# Only the API route is listed - the health check is never called from a
+# browser, so Flask-CORS skips header generation for it.
+CORS_RESOURCES = {
+    r"/generate-sudoku": {
         "origins": FRONTEND_ORIGIN,
         "methods": ["GET"],
         "allow_headers": [API_KEY_HEADER, "Content-Type"],
         # Max age tells the browser to cache the CORS check for 30 minutes (1800 seconds)
         "max_age": 1800 
     }
-})
+}
+CORS(app, resources=CORS_RESOURCES)
 
 # --- 2. SECURITY CHECKS (Before the request is processed) ---
 
@@ -43,10 +65,15 @@ def check_api_key():
         # Return 200 OK immediately for preflight requests. Flask-CORS handles the headers.
         return '', 200
 
-    # 2. API Key Check
-    incoming_key = request.headers.get(API_KEY_HEADER)
+    # 2. Public endpoints (health check) don't need a key
+    if request.path in PUBLIC_PATHS:
+        return None
+
+    # 3. API Key Check
+    incoming_key = request.headers.get(API_KEY_HEADER, "")
     
-    if not incoming_key or incoming_key != EXPECTED_API_KEY:
+    # Constant-time comparison so response timing doesn't leak the key
+    if not incoming_key or not hmac.compare_digest(incoming_key.encode(), EXPECTED_API_KEY_BYTES):
         print(f"Unauthorized access attempt with key: {incoming_key}")
         # Return 401 and stop processing the request
         return jsonify({"error": "Unauthorized Access"}), 401
@@ -58,76 +85,478 @@ def check_api_key():
 BOARD_SIZE = 9
 BOX_SIZE = 3
 
+BOARD_CELLS = BOARD_SIZE * BOARD_SIZE
+
+ALL_DIGITS = (1 << BOARD_SIZE) - 1  # 0x1FF: one bit per digit 1-9
+
+# Boards are flat length-81 uint8 arrays (cell = row * 9 + col). These tables
+# map a cell to its row, column and box without any division on the hot path.
+ROW_OF = np.array([cell // BOARD_SIZE for cell in range(BOARD_CELLS)], dtype=np.int64)
+COL_OF = np.array([cell % BOARD_SIZE for cell in range(BOARD_CELLS)], dtype=np.int64)
+BOX_OF = (ROW_OF // BOX_SIZE) * BOX_SIZE + COL_OF // BOX_SIZE
+
+# The 20 cells sharing a row, column or box with each cell
+PEERS = np.array([
+    [peer for peer in range(BOARD_CELLS)
+     if peer != cell and (ROW_OF[peer] == ROW_OF[cell] or COL_OF[peer] == COL_OF[cell]
+                          or BOX_OF[peer] == BOX_OF[cell])]
+    for cell in range(BOARD_CELLS)
+], dtype=np.int64)
+PEER_COUNT = PEERS.shape[1]
+
+# The 27 units (9 rows, 9 columns, 9 boxes) as lists of their cells
+UNITS = np.array(
+    [[cell for cell in range(BOARD_CELLS) if ROW_OF[cell] == unit] for unit in range(BOARD_SIZE)]
+    + [[cell for cell in range(BOARD_CELLS) if COL_OF[cell] == unit] for unit in range(BOARD_SIZE)]
+    + [[cell for cell in range(BOARD_CELLS) if BOX_OF[cell] == unit] for unit in range(BOARD_SIZE)],
+    dtype=np.int64)
+UNIT_COUNT = UNITS.shape[0]
+
+# Lookup tables over every 9-bit candidate mask: number of candidates, and
+# the index of the lowest candidate bit (digit = LSB_INDEX[bit] + 1)
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(ALL_DIGITS + 1)], dtype=np.uint8)
+LSB_INDEX = np.array([(mask & -mask).bit_length() - 1 if mask else 0
+                      for mask in range(ALL_DIGITS + 1)], dtype=np.uint8)
+
+# The solver is written in the subset of Python that Numba can compile:
+# numpy arrays instead of lists, no recursion and no Python-level RNG.
+#
+# Each empty cell keeps a candidate mask (bit num - 1 set while num is still
+# possible). Before branching, the solver places every naked single (a cell
+# with one candidate left) and hidden single (a digit with one possible cell
+# in a unit). Every candidate removed is logged on a trail of (cell, old mask)
+# entries and every placement on a placed-cells stack, so a failed branch is
+# undone by replaying both back to the marks saved when the branch started.
+
+@njit(cache=True, boundscheck=False)
+def select_cell(board, cand):
+    """Returns the empty cell with the fewest candidates (MRV), or -1 if the board is full."""
+    best = -1
+    min_count = BOARD_SIZE + 1
+    for cell in range(BOARD_CELLS):
+        if board[cell] == 0:
+            count = POPCOUNT[cand[cell]]
+            if count < min_count:
+                best = cell
+                min_count = count
+                if count <= 1:
+                    # Forced move (or dead end) - no better cell exists
+                    return best
+    return best
+
+@njit(cache=True, boundscheck=False)
+def place_and_propagate(board, cand, cell, bit, queue,
+                        trail_cell, trail_mask, trail_len, placed, placed_len):
+    """Places bit in cell and then every naked single that placement creates.
+
+    Returns (ok, trail_len, placed_len); ok is False when some peer runs out
+    of candidates. Changes made before a failure stay on the trail for the
+    caller to undo.
+    """
+    trail_cell[trail_len] = cell
+    trail_mask[trail_len] = cand[cell]
+    trail_len += 1
+    cand[cell] = bit
+    queue[0] = cell
+    head = 0
+    tail = 1
+    while head < tail:
+        cell = queue[head]
+        head += 1
+        bit = cand[cell]
+        board[cell] = LSB_INDEX[bit] + 1
+        placed[placed_len] = cell
+        placed_len += 1
+        for i in range(PEER_COUNT):
+            peer = PEERS[cell, i]
+            if board[peer] == 0 and cand[peer] & bit:
+                trail_cell[trail_len] = peer
+                trail_mask[trail_len] = cand[peer]
+                trail_len += 1
+                cand[peer] ^= bit
+                if cand[peer] == 0:
+                    return False, trail_len, placed_len
+                if POPCOUNT[cand[peer]] == 1:
+                    # Naked single: queue it rather than branching on it
+                    queue[tail] = peer
+                    tail += 1
+    return True, trail_len, placed_len
+
+@njit(cache=True, boundscheck=False)
+def find_hidden_single(board, cand):
+    """Returns (cell, bit) for a digit with one possible cell in some unit.
+
+    cell is -1 if there is none, -2 if some unit has a digit with no place left.
+    """
+    for unit in range(UNIT_COUNT):
+        # Digits already placed, possible in at least one / at least two cells
+        placed = 0
+        once = 0
+        twice = 0
+        for i in range(BOARD_SIZE):
+            cell = UNITS[unit, i]
+            if board[cell]:
+                placed |= 1 << (int(board[cell]) - 1)
+            else:
+                twice |= once & cand[cell]
+                once |= cand[cell]
+        if (once | placed) != ALL_DIGITS:
+            return -2, 0
+        hidden = once & ~twice & ~placed
+        if hidden:
+            bit = hidden & -hidden
+            for i in range(BOARD_SIZE):
+                cell = UNITS[unit, i]
+                if board[cell] == 0 and cand[cell] & bit:
+                    return cell, bit
+    return -1, 0
+
+@njit(cache=True, boundscheck=False)
+def propagate_hidden(board, cand, queue, trail_cell, trail_mask, trail_len, placed, placed_len):
+    """Places hidden singles (and the naked singles they create) until none are left.
+
+    Returns (ok, trail_len, placed_len) like place_and_propagate.
+    """
+    while True:
+        cell, bit = find_hidden_single(board, cand)
+        if cell == -1:
+            return True, trail_len, placed_len
+        if cell == -2:
+            return False, trail_len, placed_len
+        ok, trail_len, placed_len = place_and_propagate(
+            board, cand, cell, bit, queue, trail_cell, trail_mask, trail_len, placed, placed_len)
+        if not ok:
+            return False, trail_len, placed_len
+
+@njit(cache=True, boundscheck=False)
+def undo_to(board, cand, trail_cell, trail_mask, trail_len, trail_mark, placed, placed_len, placed_mark):
+    """Rolls candidate masks and placements back to the given marks."""
+    while trail_len > trail_mark:
+        trail_len -= 1
+        cand[trail_cell[trail_len]] = trail_mask[trail_len]
+    while placed_len > placed_mark:
+        placed_len -= 1
+        board[placed[placed_len]] = 0
+
+@njit(cache=True, boundscheck=False)
+def count_solutions(board, limit):
+    """Counts the solutions of a flat uint8 board, stopping once limit are found.
+
+    Fills the board in place; it holds the last solution found if the count
+    reached limit, and is restored to its starting state otherwise.
+    """
+    # Bit (num - 1) of row_mask[r] / col_mask[c] / box_mask[b] is set when num
+    # is already placed in that row / column / box.
+    row_mask = np.zeros(BOARD_SIZE, dtype=np.int64)
+    col_mask = np.zeros(BOARD_SIZE, dtype=np.int64)
+    box_mask = np.zeros(BOARD_SIZE, dtype=np.int64)
+    for cell in range(BOARD_CELLS):
+        num = int(board[cell])
+        if num:
+            bit = 1 << (num - 1)
+            row_mask[ROW_OF[cell]] |= bit
+            col_mask[COL_OF[cell]] |= bit
+            box_mask[BOX_OF[cell]] |= bit
+
+    cand = np.zeros(BOARD_CELLS, dtype=np.int64)
+    queue = np.empty(BOARD_CELLS, dtype=np.int64)
+    placed = np.empty(BOARD_CELLS, dtype=np.int64)
+    # Each placement logs at most its own mask plus one entry per peer
+    trail_cell = np.empty(BOARD_CELLS * (PEER_COUNT + 1), dtype=np.int64)
+    trail_mask = np.empty(BOARD_CELLS * (PEER_COUNT + 1), dtype=np.int64)
+    trail_len = 0
+    placed_len = 0
+
+    # Start from the givens: seed candidates, then place any forced cells
+    for cell in range(BOARD_CELLS):
+        if board[cell] == 0:
+            cand[cell] = ALL_DIGITS & ~(row_mask[ROW_OF[cell]] | col_mask[COL_OF[cell]] | box_mask[BOX_OF[cell]])
+            if cand[cell] == 0:
+                return 0
+    for cell in range(BOARD_CELLS):
+        if board[cell] == 0 and POPCOUNT[cand[cell]] == 1:
+            ok, trail_len, placed_len = place_and_propagate(
+                board, cand, cell, cand[cell], queue, trail_cell, trail_mask, trail_len, placed, placed_len)
+            if not ok:
+                undo_to(board, cand, trail_cell, trail_mask, trail_len, 0, placed, placed_len, 0)
+                return 0
+
+    # Iterative depth-first search over an explicit stack of branch points:
+    # (cell, untried candidates, trail and placed marks before the branch).
+    stack_cell = np.empty(BOARD_CELLS, dtype=np.int64)
+    stack_remaining = np.empty(BOARD_CELLS, dtype=np.int64)
+    stack_trail = np.empty(BOARD_CELLS, dtype=np.int64)
+    stack_placed = np.empty(BOARD_CELLS, dtype=np.int64)
+
+    ok, trail_len, placed_len = propagate_hidden(
+        board, cand, queue, trail_cell, trail_mask, trail_len, placed, placed_len)
+    if not ok:
+        undo_to(board, cand, trail_cell, trail_mask, trail_len, 0, placed, placed_len, 0)
+        return 0
+    cell = select_cell(board, cand)
+    if cell < 0:
+        # Solved by propagation alone
+        if limit > 1:
+            undo_to(board, cand, trail_cell, trail_mask, trail_len, 0, placed, placed_len, 0)
+        return 1
+    solutions = 0
+    stack_cell[0] = cell
+    stack_remaining[0] = cand[cell]
+    stack_trail[0] = trail_len
+    stack_placed[0] = placed_len
+    depth = 1
+
+    while depth:
+        top = depth - 1
+        # Undo the previous attempt at this branch point (no-op on the first)
+        undo_to(board, cand, trail_cell, trail_mask, trail_len, stack_trail[top],
+                placed, placed_len, stack_placed[top])
+        trail_len = stack_trail[top]
+        placed_len = stack_placed[top]
+        remaining = stack_remaining[top]
+        if remaining == 0:
+            depth -= 1
+            continue
+        bit = remaining & -remaining
+        stack_remaining[top] = remaining ^ bit
+        ok, trail_len, placed_len = place_and_propagate(
+            board, cand, stack_cell[top], bit, queue, trail_cell, trail_mask, trail_len, placed, placed_len)
+        if not ok:
+            continue
+        ok, trail_len, placed_len = propagate_hidden(
+            board, cand, queue, trail_cell, trail_mask, trail_len, placed, placed_len)
+        if not ok:
+            continue
+
+        cell = select_cell(board, cand)
+        if cell < 0:
+            solutions += 1
+            if solutions >= limit:
+                return solutions
+            # Keep searching: the next pass backtracks this placement
+            continue
+        stack_cell[depth] = cell
+        stack_remaining[depth] = cand[cell]
+        stack_trail[depth] = trail_len
+        stack_placed[depth] = placed_len
+        depth += 1
+
+    undo_to(board, cand, trail_cell, trail_mask, trail_len, 0, placed, placed_len, 0)
+    return solutions
+
+@njit(cache=True)
 def solve_board(board):
-    # (Simplified solver logic to generate a full board - keeps the file minimal)
-    for row in range(BOARD_SIZE):
-        for col in range(BOARD_SIZE):
-            if board[row][col] == 0:
-                for num in random.sample(range(1, 10), 9):
-                    if is_valid(board, row, col, num):
-                        board[row][col] = num
-                        if solve_board(board):
-                            return True
-                        board[row][col] = 0
-                return False
-    return True
-
-def is_valid(board, row, col, num):
-    # (Standard Sudoku validation check)
-    for i in range(BOARD_SIZE):
-        if board[row][i] == num or board[i][col] == num:
-            return False
-    start_row, start_col = row - row % BOX_SIZE, col - col % BOX_SIZE
-    for i in range(BOX_SIZE):
-        for j in range(BOX_SIZE):
-            if board[start_row + i][start_col + j] == num:
-                return False
-    return True
+    """Completes a (partially filled) flat uint8 board in place; returns False if unsolvable.
 
-def generate_full_board():
-    board = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+    Builds the base grids generate_full_board shuffles, and checks puzzles.
+    """
+    return count_solutions(board, 1) == 1
+
+if NUMBA_AVAILABLE:
+    # Compile (or load from the on-disk cache) now rather than on first use
+    solve_board(np.zeros(BOARD_CELLS, dtype=np.uint8))
+
+# Relabelling digits, permuting bands/stacks, permuting the rows/columns
+# inside them and transposing all preserve validity, but only reach grids
+# isomorphic to the one they start from. So boards are shuffled from a pool of
+# random base grids rather than one fixed grid, which would carry its
+# structure into every board served.
+BASE_BOARD_COUNT = 32
+
+def random_base_board():
+    """Solves a 9x9 grid seeded with random digits in the three diagonal boxes.
+
+    The diagonal boxes share no row, column or box, so any such seed is
+    consistent and always completes to a full grid.
+    """
+    board = np.zeros(BOARD_CELLS, dtype=np.uint8)
+    for box in range(0, BOARD_SIZE, BOX_SIZE + 1):
+        board[BOX_OF == box] = np.random.permutation(BOARD_SIZE) + 1
     solve_board(board)
-    return board
+    return board.reshape(BOARD_SIZE, BOARD_SIZE)
+
+BASE_BOARDS = np.array([random_base_board() for _ in range(BASE_BOARD_COUNT)])
+
+def shuffled_lines(keys):
+    """Random row (or column) order that keeps each band of 3 together.
+
+    keys is a (4, 3) block of random floats: row 0 orders the bands, rows
+    1-3 order the lines inside each band.
+    """
+    order = keys.argsort(axis=1)
+    return (order[0, :, None] * BOX_SIZE + order[1:]).ravel()
+
+def generate_full_board():
+    # A single RNG call supplies every permutation: argsort of uniform keys
+    # is a uniform permutation. Layout: 9 digit keys, 12 row keys,
+    # 12 column keys, one key for the transpose and one for the base grid.
+    keys = np.random.random(BOARD_SIZE + 2 * (BOX_SIZE + 1) * BOX_SIZE + 2)
+    line_keys = keys[BOARD_SIZE:-2].reshape(2, BOX_SIZE + 1, BOX_SIZE)
+
+    base = BASE_BOARDS[int(keys[-2] * BASE_BOARD_COUNT)]
+    digits = keys[:BOARD_SIZE].argsort().astype(np.uint8) + 1
+    board = digits[base - 1]
+    board = board[np.ix_(shuffled_lines(line_keys[0]), shuffled_lines(line_keys[1]))]
+    if keys[-1] < 0.5:
+        board = board.T
+    # Fancy indexing already produced a fresh array; flatten it in row order
+    return board.ravel()
+
+HOLES_BY_DIFFICULTY = {'easy': 35, 'medium': 45, 'hard': 55}
+
+# Holes are punched in pairs (cell, 80 - cell) for a symmetric puzzle; the
+# centre cell is its own mirror image.
+CENTER_CELL = BOARD_CELLS // 2
+
+def mirrored(cell):
+    return [cell] if cell == CENTER_CELL else [cell, BOARD_CELLS - 1 - cell]
+
+# Digging often stalls short of the target on a given grid (about 70% of
+# grids for hard), so unique puzzles are retried on fresh grids up to this cap
+UNIQUE_DIG_ATTEMPTS = 32
+
+def dig_unique_puzzle(full_board, num_holes):
+    """Removes up to num_holes cells in symmetric pairs, keeping the solution unique.
+
+    Pairs whose removal would allow a second solution are put back, so the
+    dig can stop short of num_holes. Returns (puzzle, holes).
+    """
+    puzzle_board = full_board.copy()
+    holes = 0
+    for pair in np.random.permutation(CENTER_CELL + 1):
+        cells = mirrored(pair)
+        if holes + len(cells) > num_holes:
+            continue
+        puzzle_board[cells] = 0
+        if count_solutions(puzzle_board.copy(), 2) == 1:
+            holes += len(cells)
+            if holes == num_holes:
+                break
+        else:
+            puzzle_board[cells] = full_board[cells]
+    return puzzle_board, holes
 
 def generate_puzzle(difficulty='medium'):
-    full_board = generate_full_board()
-    puzzle_board = copy.deepcopy(full_board)
-    
-    holes_map = {'easy': 35, 'medium': 45, 'hard': 55}
-    num_holes = holes_map.get(difficulty.lower(), 45)
-    
-    cells_to_remove = random.sample(range(81), num_holes)
+    """Returns (puzzle, solution) as flat lists; the puzzle has a single solution.
+
+    Uniqueness costs a solver run per hole pair and possibly several grids
+    (a few ms for hard). The puzzle has exactly the requested holes unless
+    every one of UNIQUE_DIG_ATTEMPTS grids stalls, in which case the deepest
+    dig is used.
+    """
+    num_holes = HOLES_BY_DIFFICULTY.get(difficulty.lower(), 45)
     
-    for index in cells_to_remove:
-        row, col = divmod(index, BOARD_SIZE)
-        puzzle_board[row][col] = 0
+    best_holes = -1
+    for _ in range(UNIQUE_DIG_ATTEMPTS):
+        board = generate_full_board()
+        puzzle, holes = dig_unique_puzzle(board, num_holes)
+        if holes > best_holes:
+            full_board, puzzle_board, best_holes = board, puzzle, holes
+        if holes == num_holes:
+            break
         
-    # Flatten the 9x9 list of lists into a single 81-element list
-    puzzle_flat = [cell for row in puzzle_board for cell in row]
-    solution_flat = [cell for row in full_board for cell in row]
+    # Convert the flat arrays into 81-element lists for JSON serialization
+    puzzle_flat = puzzle_board.tolist()
+    solution_flat = full_board.tolist()
         
     return puzzle_flat, solution_flat
 
+def generate_payload(difficulty):
+    """Generates a puzzle and serializes the complete JSON response body."""
+    puzzle, solution = generate_puzzle(difficulty)
+    return orjson.dumps({
+        "difficulty": difficulty,
+        "puzzle": puzzle,
+        "solution": solution
+    })
+
+
+# --- 4. PRECOMPUTED PUZZLE POOL ---
+
+# Generating and serializing a puzzle is the expensive part of a request, so a
+# background thread keeps a pool of ready-to-send JSON bodies per difficulty
+# and requests only pop one. Every puzzle, pooled or built inline when a pool
+# runs dry, is checked to have a unique solution (the frontend grades entries
+# against the stored solution).
+# The pools are filled at import. A forked worker (Gunicorn's preload_app) would
+# inherit the parent's pools *and* numpy's RNG state, handing out the same
+# puzzles as its siblings, so each child reseeds and rebuilds its pools right
+# after fork(). Threads do not survive fork() either, so each process starts
+# its own filler thread on first use.
+PUZZLE_POOL_SIZE = 64
+PUZZLE_POOL_LOW_WATER = 32
+PUZZLE_POOL_WAIT_SECONDS = 0.05
+
+PUZZLE_POOLS = {difficulty: deque(maxlen=PUZZLE_POOL_SIZE) for difficulty in HOLES_BY_DIFFICULTY}
+puzzle_pool_cond = threading.Condition()
+puzzle_pool_filler_started = False
+
+def fill_puzzle_pools():
+    """Refills every pool to capacity whenever one drops below the low-water mark."""
+    while True:
+        with puzzle_pool_cond:
+            puzzle_pool_cond.wait_for(
+                lambda: any(len(pool) < PUZZLE_POOL_LOW_WATER for pool in PUZZLE_POOLS.values()))
+        for difficulty, pool in PUZZLE_POOLS.items():
+            while len(pool) < PUZZLE_POOL_SIZE:
+                payload = generate_payload(difficulty)
+                with puzzle_pool_cond:
+                    pool.append(payload)
+                    puzzle_pool_cond.notify_all()
 
-# --- 4. FLASK ROUTES ---
+def take_payload(difficulty):
+    """Pops a serialized puzzle from the pool, generating one inline if it stays empty."""
+    global puzzle_pool_filler_started
+    pool = PUZZLE_POOLS[difficulty]
+    with puzzle_pool_cond:
+        if not puzzle_pool_filler_started:
+            threading.Thread(target=fill_puzzle_pools, name="puzzle-pool", daemon=True).start()
+            puzzle_pool_filler_started = True
+        puzzle_pool_cond.wait_for(lambda: pool, timeout=PUZZLE_POOL_WAIT_SECONDS)
+        payload = pool.popleft() if pool else None
+        # Wake the filler in case we just crossed the low-water mark
+        puzzle_pool_cond.notify_all()
+    if payload is None:
+        payload = generate_payload(difficulty)
+    return payload
+
+def fill_puzzle_pools_now():
+    """Synchronously tops every pool up to capacity."""
+    for difficulty, pool in PUZZLE_POOLS.items():
+        pool.extend(generate_payload(difficulty) for _ in range(PUZZLE_POOL_SIZE - len(pool)))
+
+def reset_puzzle_pools():
+    """Gives a freshly forked process its own RNG stream, base grids and puzzle pools."""
+    global puzzle_pool_cond, puzzle_pool_filler_started
+    np.random.seed()
+    BASE_BOARDS[:] = [random_base_board() for _ in range(BASE_BOARD_COUNT)]
+    puzzle_pool_cond = threading.Condition()
+    puzzle_pool_filler_started = False
+    for pool in PUZZLE_POOLS.values():
+        pool.clear()
+    fill_puzzle_pools_now()
+
+fill_puzzle_pools_now()
+os.register_at_fork(after_in_child=reset_puzzle_pools)
+
+
+# --- 5. FLASK ROUTES ---
+
+JSON_MIMETYPE = 'application/json'
 
 @app.route('/generate-sudoku', methods=['GET'])
 def get_sudoku():
     """API endpoint to generate a Sudoku puzzle."""
     
-    difficulty = request.args.get('difficulty', 'medium')
+    difficulty = request.args.get('difficulty', 'medium').lower()
     
-    if difficulty.lower() not in ['easy', 'medium', 'hard']:
+    if difficulty not in HOLES_BY_DIFFICULTY:
         return jsonify({"error": "Invalid difficulty. Choose 'easy', 'medium', or 'hard'."}), 400
     
     try:
-        puzzle, solution = generate_puzzle(difficulty)
-        
-        return jsonify({
-            "difficulty": difficulty,
-            "puzzle": puzzle,
-            "solution": solution
-        })
+        # The body is already serialized JSON bytes - hand it to the WSGI
+        # server as-is instead of going through jsonify
+        return Response(take_payload(difficulty), mimetype=JSON_MIMETYPE, direct_passthrough=True)
     except Exception as e:
         print(f"Generation error: {e}")
         return jsonify({"error": "Failed to generate Sudoku puzzle."}), 500
@@ -138,5 +567,5 @@ def home():
     return "Sudoku Generator API is running and protected!"
 
 if __name__ == '__main__':
-    # Used for local development only
-    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
+    # Used for local development only - production runs under Gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
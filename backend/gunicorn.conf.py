@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+import os
+
+# Cloud Run provides the port to listen on via the PORT environment variable
+bind = f":{os.environ.get('PORT', '8080')}"
+
+workers = 2 * (os.cpu_count() or 1) + 1
+worker_class = "gthread"
+threads = 4
+
+# Import app.py (and load the compiled solver) once in the master; forked
+# workers share those pages copy-on-write and only rebuild their puzzle pools
+preload_app = True
+
+# Recycle workers periodically to bound memory growth. The jitter staggers
+# the restarts so workers don't all rebuild their puzzle pools at once.
+max_requests = 1000
+max_requests_jitter = 100
+
+# Cloud Run enforces its own request timeout
+timeout = 0